@@ -15,7 +15,7 @@ from urllib.parse import urlencode
 from threading import Lock
 from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
 import yaml
-from r10kwebhook import webserver
+from r10kwebhook import webserver, debug
 
 logger = logging.getLogger(__name__)
 
@@ -90,6 +90,7 @@ class R10k(object):
         self.branch_to_env_map = settings.branch_to_env_map
         self.puppet_api = settings.puppet_api_uri if settings.flush_env_cache else None
         self.override_env = settings.override_environment_directories
+        self.timeline = debug.Timeline()
 
     def set_config(self):
         if not os.path.isfile(self._r10_cfgpath):
@@ -102,31 +103,59 @@ class R10k(object):
             with open(self._r10_cfgpath, 'w') as f:
                 f.write(yaml.safe_dump(config))
 
-    def deploy_env(self, name='*'):
-        if name in self._env_shelf or '*' in self._env_shelf:
+    def deploy_env(self, *names):
+        """ Deploys given branches by single run of r10k. Deploys all branches if none is given. """
+        names = set(names) or {'*'}
+        if '*' in self._env_shelf:
+            logger.warning('Requested to deploy branches %s. But all branches are already in queue.',
+                           ', '.join(sorted(names)))
+            return 'wait'
+        for name in sorted(names & self._env_shelf):
             logger.warning('Requested to deploy branch %s. But it is already in queue.', name)
+        names -= self._env_shelf
+        if not names:
             return 'wait'
-        self._env_shelf.add(name)
-        logger.debug('Waiting for lock to deploy branch %s.', name)
-        with self._lock:
-            self._env_shelf.remove(name)
-            logger.info('Deploying branch %s.', name)
-            cmd = [self.bin, 'deploy', 'environment'] if name == '*' else [self.bin, 'deploy', 'environment', name]
-            self.last_run_state = 'err' if self._exec_cmd(cmd + self.args) != 0 else 'ok'
-            if self.last_run_state == 'ok':
-                sync_output = self._sync_dirs()
-                pack = [val for key, val in sync_output.items()] if name == '*' else [sync_output[name]]
-                for basedir, env in pack:
-                    if self.generate_types:  # https://puppet.com/docs/puppet/5.5/environment_isolation.html
-                        logger.info('Generating types for environment \'%s\'.', env)
-                        if self._exec_cmd(
-                                (self.puppet_bin, 'generate', 'types', '--environment', env, '--codedir',
-                                os.path.dirname(basedir))) != 0:
-                            self.last_run_state = 'err'
-                    if self.puppet_api:
-                        logger.info('Flushing cache of environment %s. %s', env, urlopen(
-                            Request('{}/environment-cache?{}'.format(self.puppet_api, urlencode({'environment': env})),
-                                    method='DELETE'), context=ssl._create_unverified_context()).read().decode())
+        self._env_shelf.update(names)
+        branches = sorted(names)
+        logger.debug('Waiting for lock to deploy branches %s.', ', '.join(branches))
+        with self.timeline.span('deploy', branches=branches):
+            waiting_since = time.time()
+            with self._lock:
+                self.timeline.add('lock wait', waiting_since, branches=branches)
+                self._env_shelf.difference_update(names)
+                logger.info('Deploying branches %s.', ', '.join(branches))
+                cmd = [self.bin, 'deploy', 'environment']
+                if '*' not in names:
+                    cmd.extend(branches)
+                with self.timeline.span('r10k', branches=branches):
+                    self.last_run_state = 'err' if self._exec_cmd(cmd + self.args) != 0 else 'ok'
+                if self.last_run_state == 'ok':
+                    with self.timeline.span('sync'):
+                        sync_output = self._sync_dirs()
+                    if '*' in names:
+                        pack = [val for key, val in sync_output.items()]
+                    else:
+                        pack = list()
+                        for name in branches:
+                            if name in sync_output:
+                                pack.append(sync_output[name])
+                            else:
+                                logger.warning('Branch %s is absent in r10k basedir after deployment.', name)
+                                self.last_run_state = 'err'
+                    for basedir, env in pack:
+                        if self.generate_types:  # https://puppet.com/docs/puppet/5.5/environment_isolation.html
+                            logger.info('Generating types for environment \'%s\'.', env)
+                            with self.timeline.span('generate types', environment=env):
+                                if self._exec_cmd(
+                                        (self.puppet_bin, 'generate', 'types', '--environment', env, '--codedir',
+                                        os.path.dirname(basedir))) != 0:
+                                    self.last_run_state = 'err'
+                        if self.puppet_api:
+                            with self.timeline.span('flush', environment=env):
+                                logger.info('Flushing cache of environment %s. %s', env, urlopen(
+                                    Request('{}/environment-cache?{}'.format(self.puppet_api,
+                                                                             urlencode({'environment': env})),
+                                            method='DELETE'), context=ssl._create_unverified_context()).read().decode())
         return self.last_run_state
 
     def _rename_branch(self, name, prefix=None):
@@ -241,18 +270,25 @@ class App(object):
             'flush_env_cache': True,
             'initial_deployment': True,
             'override_environment_directories': False,
+            'debug_endpoints': False,
             'puppet_api_uri': 'https://localhost:8140/puppet-admin-api/v1'
         })
         self.metrics = {'requests': {'rejected': 0, 'accepted': 0}, 'r10k': {'hits': 0, 'errors': 0}}
         self._r10k = R10k(self.config)
         self._webserver = webserver.WebServer(self.config.host, self.config.port)
-        self._webserver.register_handlers(self)
+        self.register_handlers()
         if isinstance(self.config.allowed_branches, str):
             self.config.allowed_branches = re.compile(self.config.allowed_branches)
         if self.config.initial_deployment:
             if self._r10k.deploy_env() == 'err':
                 self.metrics['r10k']['errors'] += 1
 
+    def register_handlers(self):
+        self._webserver.register_handlers(self)
+        if self.config.debug_endpoints:
+            logger.warning('Debug endpoints are enabled.')
+            self._webserver.register_handlers(debug.Diagnostics(self._r10k.timeline))
+
     @staticmethod
     def flat_dict(_dict, pkey=''):
         out = dict()
@@ -273,17 +309,27 @@ class App(object):
 
     @webserver.path('/api')  # TODO: make REST-ful e.g. '/api/environments/<env>/deploy'
     def do(self, data):
-        if 'ref' in data:
-            branch = data['ref'].split('/')[-1]
-            if self.is_branch_valid(branch):
-                self.metrics['requests']['accepted'] += 1
-                response = self._r10k.deploy_env(branch)
-                if response == 'err':
-                    self.metrics['r10k']['errors'] += 1
-                else:
-                    self.metrics['r10k']['hits'] += 1
-                return response
-            logger.warning('Branch name \'%s\' is invalid. Check parameter \'allowed_branches\' in config.', branch)
+        refs = list()
+        if isinstance(data, dict):
+            refs = data.get('refs', [data['ref']] if 'ref' in data else [])
+        if not isinstance(refs, list) or not all(isinstance(ref, str) for ref in refs):
+            logger.warning('Refs %s are invalid. Expected list of strings.', refs)
+            refs = list()
+        branches = list()
+        for ref in refs:
+            branch = ref.split('/')[-1]
+            if branch and self.is_branch_valid(branch):
+                branches.append(branch)
+            else:
+                logger.warning('Branch name \'%s\' is invalid. Check parameter \'allowed_branches\' in config.', branch)
+        if branches:
+            self.metrics['requests']['accepted'] += 1
+            response = self._r10k.deploy_env(*branches)
+            if response == 'err':
+                self.metrics['r10k']['errors'] += 1
+            else:
+                self.metrics['r10k']['hits'] += 1
+            return response
         self.metrics['requests']['rejected'] += 1
         return 'err'
 
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import json
+import math
+import logging
+import traceback
+import threading
+from collections import deque, Counter
+from contextlib import contextmanager
+from r10kwebhook import webserver
+
+logger = logging.getLogger(__name__)
+
+
+class Timeline(object):
+    """ Keeps stages of recent deployments as trace events """
+
+    def __init__(self, maxlen=1000):
+        self._events = deque(maxlen=maxlen)
+
+    def add(self, name, start, **args):
+        """ Records stage which has started at 'start' and finished now """
+        end = time.time()
+        self._events.append({'name': name, 'cat': 'deploy', 'ph': 'X', 'ts': int(start * 1e6),
+                             'dur': int((end - start) * 1e6), 'pid': os.getpid(), 'tid': threading.get_ident(),
+                             'thread': threading.current_thread().name, 'args': args})
+
+    @contextmanager
+    def span(self, name, **args):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add(name, start, **args)
+
+    def events(self):
+        return list(self._events)
+
+
+class Diagnostics(object):
+    """ Handlers of endpoints '/debug/*'. Registered in webserver only if parameter 'debug_endpoints' is set. """
+    MAX_DURATION = 60
+
+    def __init__(self, timeline):
+        self.timeline = timeline
+        self._profiling = threading.Lock()
+
+    @staticmethod
+    def _thread_names():
+        return {thread.ident: thread.name for thread in threading.enumerate()}
+
+    @staticmethod
+    def _number(data, key, default):
+        """ :returns finite positive float from data[key] or None if it's invalid """
+        try:
+            value = float(data.get(key, default))
+        except (TypeError, ValueError):
+            return None
+        return value if math.isfinite(value) and value > 0 else None
+
+    @staticmethod
+    def _frame_name(frame):
+        code = frame.f_code
+        return '{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+    @webserver.path('/debug/threads')
+    def dump_threads(self, data):
+        names = self._thread_names()
+        out = list()
+        for ident, frame in sys._current_frames().items():
+            out.append('Thread {} ({}):\n{}'.format(names.get(ident, 'unknown'), ident,
+                                                    ''.join(traceback.format_stack(frame))))
+        return '\n'.join(out)
+
+    @webserver.path('/debug/profile')
+    def profile(self, data):
+        """ Samples stacks of all threads during 'duration' seconds every 'interval' seconds.
+        :returns collapsed stacks, one per line, suitable for flamegraph.pl
+        """
+        data = data if isinstance(data, dict) else dict()
+        duration, interval = self._number(data, 'duration', 5), self._number(data, 'interval', 0.01)
+        if duration is None or interval is None:
+            logger.warning('Requested profiling with invalid duration or interval: %s', data)
+            return 'err'
+        duration, interval = min(duration, self.MAX_DURATION), max(interval, 0.001)
+        if not self._profiling.acquire(blocking=False):
+            logger.warning('Requested profiling. But it is already running.')
+            return 'wait'
+        try:
+            logger.info('Profiling threads for %s s.', duration)
+            samples = Counter()
+            own_ident = threading.get_ident()
+            deadline = time.time() + duration
+            while time.time() < deadline:
+                names = self._thread_names()
+                for ident, frame in sys._current_frames().items():
+                    if ident == own_ident:
+                        continue
+                    stack = list()
+                    while frame is not None:
+                        stack.append(self._frame_name(frame))
+                        frame = frame.f_back
+                    stack.append(names.get(ident, 'unknown').replace(';', ':'))
+                    samples[';'.join(reversed(stack))] += 1
+                time.sleep(interval)
+        finally:
+            self._profiling.release()
+        return '\n'.join('{} {}'.format(stack, count) for stack, count in sorted(samples.items()))
+
+    @webserver.path('/debug/timeline')
+    def get_timeline(self, data):
+        """ :returns stages of recent deployments in Trace Event Format """
+        events = list()
+        tids = dict()  # idents may be reused by threads, so each pair of ident and name gets own tid
+        for event in self.timeline.events():
+            event = dict(event)
+            event['tid'] = tids.setdefault((event['tid'], event.pop('thread')), len(tids) + 1)
+            events.append(event)
+        meta = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': name}}
+                for (ident, name), tid in tids.items()]
+        return json.dumps({'traceEvents': meta + events})
@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import sys
 import json
 from urllib.request import Request, urlopen
 from multiprocessing.pool import ThreadPool
@@ -21,14 +22,29 @@ class MgmtServer(object):
         except (URLError, HTTPError):
             return 'err'
 
-    def deploy_ref(self, ref):
-        return self._execute(self._get_request(json.dumps({'ref': ref})))
+    def deploy_refs(self, refs):
+        # 'ref' is kept for daemons which don't support 'refs' yet
+        return self._execute(self._get_request(json.dumps({'ref': refs[0], 'refs': refs})))
 
 
-def deploy(ref, servers, port):
+def read_refs(lines):
+    """ Extracts names of updated branches from lines '<old-value> <new-value> <ref-name>' given to post-receive hook.
+    Deleted branches and refs other than branches are skipped.
+    """
+    refs = list()
+    for line in lines:
+        fields = line.split()
+        if len(fields) != 3 or not fields[2].startswith('refs/heads/') or not fields[1].strip('0'):
+            continue
+        if fields[2] not in refs:
+            refs.append(fields[2])
+    return refs
+
+
+def deploy(refs, servers, port):
     pool = ThreadPool(processes=min(len(servers), 10))
     servers = [MgmtServer(fqdn, port) for fqdn in set(servers)]
-    results = [pool.apply_async(srv.deploy_ref, (ref,)) for srv in servers]
+    results = [pool.apply_async(srv.deploy_refs, (refs,)) for srv in servers]
     counter = [0, 0]
     for result in results:
         response = result.get()
@@ -41,7 +57,7 @@ def deploy(ref, servers, port):
 
 def main():
     parser = ArgumentParser(formatter_class=ArgumentDefaultsHelpFormatter)
-    parser.add_argument('-b', '--branch', default=None, help='Branch to deploy')
+    parser.add_argument('-b', '--branch', default=None, help='One or more branches to deploy', nargs='+')
     parser.add_argument('-p', '--port', default=8088, type=int, help='Port of server application')
     srvs = parser.add_mutually_exclusive_group(required=True)
     srvs.add_argument('-s', '--server', default=None, help='One or more servers', nargs='+')
@@ -53,14 +69,17 @@ def main():
     else:
         servers = args.server
     if args.branch:
-        ref = args.branch
+        refs = args.branch
     else:
-        ref = input().split()[2]
-    deployed, triggered = deploy(ref, servers, args.port)
+        refs = read_refs(sys.stdin)
+    if not refs:
+        return
+    subject = 'the branch' if len(refs) == 1 else 'the branches'
+    deployed, triggered = deploy(refs, servers, args.port)
     if triggered:
-        print('Triggered deployment of the branch at {} servers out of {}.'.format(triggered, len(servers)))
+        print('Triggered deployment of {} at {} servers out of {}.'.format(subject, triggered, len(servers)))
     if deployed:
-        print('Deployed the branch to {} servers out of {}.'.format(deployed, len(servers)))
+        print('Deployed {} to {} servers out of {}.'.format(subject, deployed, len(servers)))
 
 
 if __name__ == '__main__':
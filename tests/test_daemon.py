@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
 import re
 import os
+import threading
 import pytest
 import r10kwebhook
+from r10kwebhook import debug
 
 
 def test_is_branch_valid():
@@ -77,3 +79,77 @@ def test_metrics():
     assert r10kwebhook.App.flat_dict(
         {'requests': {'rejected': 0, 'accepted': 0}, 'r10k': {'hits': 0, 'errors': 0}}) == {
                'requests.rejected': 0, 'requests.accepted': 0, 'r10k.hits': 0, 'r10k.errors': 0}
+
+
+def test_do():
+    class R10k(object):
+        deployed = list()
+
+        def deploy_env(self, *names):
+            self.deployed.append(names)
+            return 'ok'
+
+    class App(object):
+        config = r10kwebhook.Settings({'allowed_branches': re.compile('^(env_[a-zA-Z0-9_]+|master)$')})
+        metrics = {'requests': {'rejected': 0, 'accepted': 0}, 'r10k': {'hits': 0, 'errors': 0}}
+        _r10k = R10k()
+        is_branch_valid = r10kwebhook.App.is_branch_valid
+
+    app = App()
+    assert r10kwebhook.App.do(app, {'ref': 'refs/heads/master'}) == 'ok'
+    assert r10kwebhook.App.do(app, {'refs': ['refs/heads/master', 'refs/heads/sample', 'refs/heads/env_1']}) == 'ok'
+    assert r10kwebhook.App.do(app, {'refs': ['refs/heads/sample']}) == 'err'
+    assert r10kwebhook.App.do(app, '') == 'err'
+    assert r10kwebhook.App.do(app, {'refs': 'refs/heads/master'}) == 'err'
+    assert r10kwebhook.App.do(app, {'refs': None}) == 'err'
+    assert r10kwebhook.App.do(app, {'refs': ['refs/heads/master', 1]}) == 'err'
+    assert r10kwebhook.App.do(app, {'ref': 1}) == 'err'
+    assert R10k.deployed == [('master',), ('master', 'env_1')]
+    assert app.metrics == {'requests': {'rejected': 6, 'accepted': 2}, 'r10k': {'hits': 2, 'errors': 0}}
+
+    App.config.allowed_branches = re.compile('.*')
+    assert r10kwebhook.App.do(app, {'refs': ['refs/heads/']}) == 'err'
+    assert R10k.deployed == [('master',), ('master', 'env_1')]
+
+
+def test_r10k_deploy_env():
+    class R10k(object):
+        bin = 'r10k'
+        args = ['-v']
+        generate_types = False
+        puppet_api = None
+        last_run_state = 'ok'
+        _lock = threading.Lock()
+        _env_shelf = set()
+        timeline = debug.Timeline()
+        commands = list()
+
+        def _exec_cmd(self, args):
+            self.commands.append(list(args))
+            return 0
+
+        def _sync_dirs(self):
+            return {'env_a': ('/etc/puppet', 'a'), 'env_b': ('/etc/puppet', 'b')}
+
+    r10k = R10k()
+    assert r10kwebhook.R10k.deploy_env(r10k, 'env_b', 'env_a', 'env_b') == 'ok'
+    assert r10kwebhook.R10k.deploy_env(r10k) == 'ok'
+    assert r10k.commands == [['r10k', 'deploy', 'environment', 'env_a', 'env_b', '-v'],
+                             ['r10k', 'deploy', 'environment', '-v']]
+    assert r10k._env_shelf == set()
+
+    r10k.commands.clear()
+    r10k._env_shelf.add('env_a')
+    assert r10kwebhook.R10k.deploy_env(r10k, 'env_a') == 'wait'
+    assert r10kwebhook.R10k.deploy_env(r10k, 'env_a', 'env_b') == 'ok'
+    assert r10k.commands == [['r10k', 'deploy', 'environment', 'env_b', '-v']]
+    assert r10k._env_shelf == {'env_a'}
+
+    r10k.commands.clear()
+    r10k._env_shelf = {'*'}
+    assert r10kwebhook.R10k.deploy_env(r10k, 'env_b') == 'wait'
+    assert r10kwebhook.R10k.deploy_env(r10k) == 'wait'
+    assert r10k.commands == []
+
+    r10k._env_shelf = set()
+    assert r10kwebhook.R10k.deploy_env(r10k, 'env_a', 'env_missing') == 'err'
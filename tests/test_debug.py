@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+import json
+import threading
+from unittest import mock
+import r10kwebhook
+from r10kwebhook import debug
+
+
+def test_timeline():
+    timeline = debug.Timeline(maxlen=2)
+    with timeline.span('r10k', branches=['master']):
+        pass
+    timeline.add('sync', 0)
+    timeline.add('flush', 0, environment='production')
+    events = timeline.events()
+    assert [event['name'] for event in events] == ['sync', 'flush']
+    assert events[1]['args'] == {'environment': 'production'}
+    assert events[1]['ph'] == 'X' and events[1]['tid'] == threading.get_ident()
+
+    trace = json.loads(debug.Diagnostics(timeline).get_timeline(''))
+    assert [event['ph'] for event in trace['traceEvents']] == ['M', 'X', 'X']
+    assert trace['traceEvents'][0]['args'] == {'name': threading.current_thread().name}
+    assert {event['tid'] for event in trace['traceEvents']} == {1}
+
+
+def test_timeline_thread_names():
+    timeline = debug.Timeline()
+    thread = threading.Thread(target=timeline.add, args=('r10k', 0), name='handler')
+    thread.start()
+    thread.join()
+    timeline.add('sync', 0)
+    trace = json.loads(debug.Diagnostics(timeline).get_timeline(''))
+    names = {event['tid']: event['args']['name'] for event in trace['traceEvents'] if event['ph'] == 'M'}
+    assert [names[event['tid']] for event in trace['traceEvents'] if event['ph'] == 'X'] == [
+        'handler', threading.current_thread().name]
+
+
+def test_profile_invalid_input():
+    diagnostics = debug.Diagnostics(debug.Timeline())
+    assert diagnostics.profile({'duration': 'abc'}) == 'err'
+    assert diagnostics.profile({'duration': -1}) == 'err'
+    assert diagnostics.profile({'duration': None}) == 'err'
+    assert diagnostics.profile({'interval': 'nan'}) == 'err'
+    assert diagnostics.profile({'interval': 0}) == 'err'
+
+
+def test_dump_threads():
+    assert 'test_dump_threads' in debug.Diagnostics(debug.Timeline()).dump_threads('')
+
+
+def test_profile():
+    stop = threading.Event()
+
+    def sleeper():
+        stop.wait()
+
+    thread = threading.Thread(target=sleeper, name='sleeper')
+    thread.start()
+    try:
+        stacks = debug.Diagnostics(debug.Timeline()).profile({'duration': 0.05, 'interval': 0.01})
+    finally:
+        stop.set()
+        thread.join()
+    lines = [line for line in stacks.split('\n') if line.startswith('sleeper;')]
+    assert lines
+    stack, count = lines[0].rsplit(' ', 1)
+    assert 'sleeper (test_debug.py:' in stack and int(count) > 0
+    assert 'test_profile' not in stacks
+
+
+def test_deploy_env_stages():
+    class R10k(object):
+        bin = 'r10k'
+        args = ['-v']
+        generate_types = True
+        puppet_bin = 'puppet'
+        puppet_api = 'https://localhost:8140/puppet-admin-api/v1'
+        last_run_state = 'ok'
+        _lock = threading.Lock()
+        _env_shelf = set()
+        timeline = debug.Timeline()
+
+        def _exec_cmd(self, args):
+            return 0
+
+        def _sync_dirs(self):
+            return {'env_a': ('/etc/puppet', 'a')}
+
+    with mock.patch('r10kwebhook.urlopen') as urlopen:
+        urlopen.return_value.read.return_value = b''
+        assert r10kwebhook.R10k.deploy_env(R10k(), 'env_a') == 'ok'
+    events = R10k.timeline.events()
+    assert [event['name'] for event in events] == ['lock wait', 'r10k', 'sync', 'generate types', 'flush', 'deploy']
+    assert events[0]['args'] == {'branches': ['env_a']}
+    assert events[3]['args'] == {'environment': 'a'}
+
+
+def test_register_handlers():
+    class WebServer(object):
+        handlers = list()
+
+        def register_handlers(self, obj):
+            self.handlers.append(obj)
+
+    class App(object):
+        config = r10kwebhook.Settings({'debug_endpoints': False})
+        _webserver = WebServer()
+        _r10k = type('R10k', (object,), {'timeline': debug.Timeline()})
+
+    app = App()
+    r10kwebhook.App.register_handlers(app)
+    assert WebServer.handlers == [app]
+
+    App.config.debug_endpoints = True
+    r10kwebhook.App.register_handlers(app)
+    assert WebServer.handlers[1] is app
+    assert isinstance(WebServer.handlers[2], debug.Diagnostics)
+    assert WebServer.handlers[2].timeline is App._r10k.timeline
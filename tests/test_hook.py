@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import json
 from urllib.request import Request
 from r10kwebhook import hook
 
@@ -14,3 +15,23 @@ def test_requests():
     requests = [srv._get_request(data) for srv in servers]
     assert [r.full_url for r in requests] == ['http://fe2-t-stg-1.ae.core.sw:8088/api', 'http://kt-mgmt-2.starfaking.da:8088/api']
     assert [r.data for r in requests] == [data.encode(), data.encode()]
+
+
+def test_read_refs():
+    lines = ['0000000 1111111 refs/heads/master\n',
+             '2222222 3333333 refs/heads/env_sample\n',
+             '\n',
+             '4444444 0000000 refs/heads/env_deleted\n',
+             '5555555 6666666 refs/tags/v1.0\n',
+             '4444444 5555555 refs/heads/master\n']
+    assert hook.read_refs(lines) == ['refs/heads/master', 'refs/heads/env_sample']
+    assert hook.read_refs([]) == []
+
+
+def test_deploy_refs():
+    class MgmtServer(hook.MgmtServer):
+        def _execute(self, request):
+            return request.data.decode()
+
+    data = json.loads(MgmtServer(SERVERS[0], 8088).deploy_refs(['refs/heads/master', 'refs/heads/env_sample']))
+    assert data == {'ref': 'refs/heads/master', 'refs': ['refs/heads/master', 'refs/heads/env_sample']}